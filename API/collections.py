@@ -7,20 +7,22 @@ import sys
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 # Importer la gestion des tokens depuis le module des clients
-from utils import get_access_token, load_tokens, _rate_limiters, _tokens
-
-# Configuration Shopify
-SHOPIFY_DOMAIN = "broderiedumonde.com"  # Remplacez par votre domaine Shopify
-API_VERSION = "2025-01"
+from utils import get_access_token, get_shop, load_tokens, _rate_limiters, _tokens
+from API.response_cache import default_cache
 
 # Charger les tokens (si ce n'est pas déjà fait)
 load_tokens()
 
-async def get_all_smart_collections(token_index=0):
+# Configuration Shopify : boutique par défaut (voir utils.load_shops)
+SHOPIFY_DOMAIN = get_shop().domain
+API_VERSION = get_shop().api_version
+
+_SMART_COLLECTIONS_CACHE_KEY = f"{SHOPIFY_DOMAIN}_smart_collections"
+
+
+async def get_all_smart_collections(token_index=0, use_cache=True):
     # Récupère le token et la clé associée
     access_token, token_key = get_access_token(token_index)
-    # Appliquer le rate limiting
-    await _rate_limiters[token_key].acquire()
 
     url = f"https://{SHOPIFY_DOMAIN}/admin/api/{API_VERSION}/smart_collections.json"
     headers = {
@@ -28,6 +30,23 @@ async def get_all_smart_collections(token_index=0):
         "Content-Type": "application/json"
     }
     async with aiohttp.ClientSession() as session:
+        if use_cache:
+            # Les collections changent rarement : cache disque avec TTL et ETag
+            try:
+                data = await default_cache.get_json(
+                    session,
+                    url,
+                    headers,
+                    "smart_collections",
+                    _SMART_COLLECTIONS_CACHE_KEY,
+                    limiter=_rate_limiters[token_key],
+                )
+            except Exception as e:
+                print("Exception during get smart_collections:", e)
+                return []
+            return data.get("smart_collections", [])
+        # Appliquer le rate limiting
+        await _rate_limiters[token_key].acquire()
         async with session.get(url, headers=headers) as response:
             data = await response.json()
             return data.get("smart_collections", [])
@@ -56,7 +75,11 @@ async def create_smart_collection(collection_data, token_index=0):
     }
     async with aiohttp.ClientSession() as session:
         async with session.post(url, json=payload, headers=headers) as response:
-            return await response.json()
+            data = await response.json()
+            # Invalidation après succès : une lecture concurrente ne remet pas en cache la liste d'avant
+            if response.ok:
+                default_cache.invalidate(_SMART_COLLECTIONS_CACHE_KEY)
+            return data
 
 
 async def update_smart_collection(collection_id, collection_data, token_index=0):
@@ -78,4 +101,7 @@ async def update_smart_collection(collection_id, collection_data, token_index=0)
     }
     async with aiohttp.ClientSession() as session:
         async with session.put(url, json=payload, headers=headers) as response:
-            return await response.json()
+            data = await response.json()
+            if response.ok:
+                default_cache.invalidate(_SMART_COLLECTIONS_CACHE_KEY)
+            return data
@@ -0,0 +1,269 @@
+import os
+import sys
+
+import aiohttp
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from utils import get_access_token, _cost_budgets
+from API.products import graphql_request
+
+# Mutation -> (types des arguments, sélection du résultat), selon le schéma 2025-01
+MUTATIONS = {
+    "productCreate": (
+        {"product": "ProductCreateInput!"},
+        "product { id title handle variants(first: 1) { nodes { id } } }",
+    ),
+    "productUpdate": ({"product": "ProductUpdateInput!"}, "product { id title handle }"),
+    "productVariantsBulkUpdate": (
+        {"productId": "ID!", "variants": "[ProductVariantsBulkInput!]!"},
+        "productVariants { id sku }",
+    ),
+    "metafieldsSet": ({"metafields": "[MetafieldsSetInput!]!"}, "metafields { id namespace key ownerType }"),
+}
+
+# Coût demandé d'une mutation simple chez Shopify, affiné ensuite par les réponses
+_DEFAULT_MUTATION_COST = 10
+# Coût maximal accepté pour une requête unique, quel que soit le plan
+_MAX_SINGLE_QUERY_COST = 1000
+
+
+def _product_gid(product_id):
+    return product_id if str(product_id).startswith("gid://") else f"gid://shopify/Product/{product_id}"
+
+
+def build_product_input(data):
+    """
+    Construit un ProductCreateInput / ProductUpdateInput (2025-01) à partir d'un
+    payload REST. Les variantes n'en font plus partie : voir build_variant_input.
+    """
+    product_input = {
+        "title": data.get("title"),
+        "descriptionHtml": data.get("body_html"),
+        "vendor": data.get("vendor"),
+        "productType": data.get("product_type"),
+        "status": "ACTIVE" if (data.get("status") or "").lower() == "active" else "DRAFT",
+    }
+    if data.get("handle"):
+        product_input["handle"] = data["handle"]
+    tags = data.get("tags")
+    if isinstance(tags, str):
+        tags = [tag.strip() for tag in tags.split(",") if tag.strip()]
+    if tags:
+        product_input["tags"] = tags
+    seo = {}
+    if data.get("metafields_global_title_tag"):
+        seo["title"] = data["metafields_global_title_tag"]
+    if data.get("metafields_global_description_tag"):
+        seo["description"] = data["metafields_global_description_tag"]
+    if seo:
+        product_input["seo"] = seo
+    metafields = [
+        {key: mf[key] for key in ("namespace", "key", "value", "type") if key in mf}
+        for mf in data.get("metafields") or []
+    ]
+    if metafields:
+        product_input["metafields"] = metafields
+    return product_input
+
+
+def build_variant_input(variant_id, variant):
+    """ProductVariantsBulkInput (2025-01) pour la variante par défaut créée avec le produit."""
+    variant_input = {
+        "id": variant_id,
+        "price": variant.get("price"),
+        "inventoryPolicy": (variant.get("inventory_policy") or "deny").upper(),
+        "taxable": variant.get("taxable", True),
+    }
+    if variant.get("barcode"):
+        variant_input["barcode"] = variant["barcode"]
+    inventory_item = {"tracked": variant.get("inventory_management") == "shopify"}
+    if variant.get("sku"):
+        inventory_item["sku"] = variant["sku"]
+    if variant.get("cost"):
+        inventory_item["cost"] = variant["cost"]
+    if variant.get("requires_shipping") is not None:
+        inventory_item["requiresShipping"] = variant["requires_shipping"]
+    if variant.get("weight") is not None:
+        inventory_item["measurement"] = {"weight": {"unit": "GRAMS", "value": variant["weight"]}}
+    variant_input["inventoryItem"] = inventory_item
+    return variant_input
+
+
+class GraphQLMutationBatcher:
+    """
+    Regroupe des mutations indépendantes dans un même document GraphQL à l'aide
+    d'alias (m0, m1, …). La taille des lots suit le budget de coût du token
+    (throttleStatus) et les userErrors sont redistribués à chaque entrée.
+    Un lot rejeté en bloc (erreur de validation sans data) est coupé en deux et
+    renvoyé, jusqu'à isoler l'entrée fautive.
+    """
+
+    def __init__(self, token_index=0, max_batch_size=50):
+        self.token_index = token_index
+        self.max_batch_size = max_batch_size
+        self.cost_per_mutation = _DEFAULT_MUTATION_COST
+        self.pending = []
+
+    def add(self, mutation_name, arguments, label=None):
+        """arguments : dictionnaire nom d'argument -> valeur, selon MUTATIONS."""
+        if mutation_name not in MUTATIONS:
+            raise ValueError(f"Mutation non supportée : {mutation_name}")
+        self.pending.append({"mutation": mutation_name, "arguments": arguments, "label": label})
+        return len(self.pending) - 1
+
+    def add_product_create(self, product_data, label=None):
+        raw_input = product_data.get("product", product_data)
+        return self.add("productCreate", {"product": build_product_input(raw_input)}, label or raw_input.get("title"))
+
+    def add_product_update(self, product_id, product_data, label=None):
+        raw_input = product_data.get("product", product_data)
+        input_data = build_product_input(raw_input)
+        input_data["id"] = _product_gid(product_id)
+        return self.add("productUpdate", {"product": input_data}, label or raw_input.get("title"))
+
+    def add_variants_update(self, product_id, variants, label=None):
+        return self.add(
+            "productVariantsBulkUpdate",
+            {"productId": _product_gid(product_id), "variants": variants},
+            label,
+        )
+
+    def add_metafields_set(self, metafields, label=None):
+        return self.add("metafieldsSet", {"metafields": metafields}, label)
+
+    def _next_batch_size(self):
+        _, token_key = get_access_token(self.token_index)
+        budget = _cost_budgets[token_key]
+        # Un lot ne dépasse jamais le seau complet, et vise ce qui est disponible tout de suite
+        affordable = min(_MAX_SINGLE_QUERY_COST, max(budget.available, budget.maximum / 4))
+        return max(1, min(self.max_batch_size, int(affordable // self.cost_per_mutation)))
+
+    @staticmethod
+    def build_document(entries):
+        declarations = []
+        fields = []
+        variables = {}
+        for idx, entry in enumerate(entries):
+            arg_types, selection = MUTATIONS[entry["mutation"]]
+            call_args = []
+            for arg_name, arg_type in arg_types.items():
+                declarations.append(f"$v{idx}_{arg_name}: {arg_type}")
+                call_args.append(f"{arg_name}: $v{idx}_{arg_name}")
+                variables[f"v{idx}_{arg_name}"] = entry["arguments"][arg_name]
+            fields.append(
+                f"  m{idx}: {entry['mutation']}({', '.join(call_args)}) {{ {selection} userErrors {{ field message }} }}"
+            )
+        document = "mutation batch(" + ", ".join(declarations) + ") {\n" + "\n".join(fields) + "\n}"
+        return document, variables
+
+    async def execute(self, session=None):
+        """
+        Envoie toutes les mutations en attente. Retourne, dans l'ordre d'ajout,
+        un dictionnaire par entrée : label, mutation, data, userErrors, error.
+        """
+        entries, self.pending = self.pending, []
+        results = []
+        if session is None:
+            async with aiohttp.ClientSession() as own_session:
+                await self._execute_entries(own_session, entries, results)
+        else:
+            await self._execute_entries(session, entries, results)
+        return results
+
+    async def _execute_entries(self, session, entries, results):
+        position = 0
+        while position < len(entries):
+            batch = entries[position:position + self._next_batch_size()]
+            results.extend(await self._send_batch(session, batch))
+            position += len(batch)
+
+    async def _send_batch(self, session, batch):
+        document, variables = self.build_document(batch)
+        response = await graphql_request(
+            session,
+            document,
+            variables,
+            token_index=self.token_index,
+            estimated_cost=self.cost_per_mutation * len(batch),
+        )
+        requested = (response or {}).get("extensions", {}).get("cost", {}).get("requestedQueryCost")
+        if requested:
+            self.cost_per_mutation = max(1.0, requested / len(batch))
+
+        if response is not None and len(batch) > 1 and _rejected_as_a_whole(response):
+            # Une seule entrée invalide fait rejeter tout le document : on isole la fautive
+            middle = len(batch) // 2
+            return await self._send_batch(session, batch[:middle]) + await self._send_batch(session, batch[middle:])
+        return self._demultiplex(batch, response)
+
+    @staticmethod
+    def _demultiplex(batch, response):
+        if response is None:
+            return [_entry_result(entry, error="Erreur HTTP") for entry in batch]
+
+        data = response.get("data") or {}
+        errors_by_alias = {}
+        global_errors = []
+        for err in response.get("errors") or []:
+            path = err.get("path") or []
+            if path:
+                errors_by_alias.setdefault(path[0], []).append(err)
+            else:
+                global_errors.append(err)
+
+        results = []
+        for idx, entry in enumerate(batch):
+            alias = f"m{idx}"
+            payload = data.get(alias)
+            error = errors_by_alias.get(alias) or (global_errors if payload is None else None)
+            if error:
+                print(f"GraphQL errors pour {entry['label'] or alias} :", error)
+            user_errors = (payload or {}).get("userErrors") or []
+            if user_errors:
+                print(f"userErrors pour {entry['label'] or alias} :", user_errors)
+            results.append(_entry_result(entry, payload, user_errors, error))
+        return results
+
+
+def _rejected_as_a_whole(response):
+    errors = response.get("errors") or []
+    return bool(errors) and not response.get("data") and not any(err.get("path") for err in errors)
+
+
+def _entry_result(entry, data=None, user_errors=None, error=None):
+    return {
+        "label": entry["label"],
+        "mutation": entry["mutation"],
+        "data": data,
+        "userErrors": user_errors or [],
+        "error": error,
+    }
+
+
+async def create_products_graphql_batched(products_data, token_index=0, max_batch_size=50):
+    """
+    Équivalent groupé de create_product_graphql pour une liste de payloads REST.
+    Deux phases groupées : productCreate, puis productVariantsBulkUpdate pour
+    renseigner la variante par défaut (prix, SKU, EAN, poids…) des produits créés.
+    Les quantités en stock restent à fixer via update_stock.
+    Retourne un résultat par produit, celui de la création, enrichi de "variantResult".
+    """
+    batcher = GraphQLMutationBatcher(token_index=token_index, max_batch_size=max_batch_size)
+    raw_inputs = [product_data.get("product", product_data) for product_data in products_data]
+    async with aiohttp.ClientSession() as session:
+        for raw_input in raw_inputs:
+            batcher.add_product_create(raw_input)
+        results = await batcher.execute(session)
+
+        variant_results = {}
+        for idx, (raw_input, result) in enumerate(zip(raw_inputs, results)):
+            product = (result["data"] or {}).get("product")
+            variants = raw_input.get("variants") or []
+            default_variants = (product or {}).get("variants", {}).get("nodes", [])
+            if not product or not variants or not default_variants:
+                continue
+            variant_input = build_variant_input(default_variants[0]["id"], variants[0])
+            variant_results[batcher.add_variants_update(product["id"], [variant_input], result["label"])] = idx
+        for position, variant_result in enumerate(await batcher.execute(session)):
+            results[variant_results[position]]["variantResult"] = variant_result
+    return results
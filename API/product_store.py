@@ -0,0 +1,160 @@
+import json
+import os
+from datetime import datetime
+
+
+DEFAULT_STORE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'product_store.json')
+
+
+class ProductStore:
+    """
+    Copie locale du catalogue Shopify, tenue à jour par les webhooks.
+
+    Les produits sont conservés tels que renvoyés par l'API REST (clé = ID produit),
+    avec des index par SKU, handle et inventory_item_id pour éviter de re-paginer
+    tout le catalogue lors des imports et des synchronisations de stock.
+    """
+
+    def __init__(self, path=DEFAULT_STORE_FILE):
+        self.path = path
+        self.products = {}
+        self.inventory_levels = {}
+        self._by_sku = {}
+        self._by_handle = {}
+        self._by_inventory_item = {}
+        self.dirty = False
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return self
+        with open(self.path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        self.products = {str(pid): product for pid, product in data.get("products", {}).items()}
+        self.inventory_levels = data.get("inventory_levels", {})
+        self._rebuild_indexes()
+        self.dirty = False
+        return self
+
+    def save(self):
+        # Écriture atomique pour ne jamais laisser un fichier tronqué
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"products": self.products, "inventory_levels": self.inventory_levels}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+        self.dirty = False
+
+    def seed(self, products):
+        """Initialise le store à partir d'un export complet (ex. get_all_products)."""
+        self.products = {}
+        for product in products:
+            self.products[str(product["id"])] = product
+        self._rebuild_indexes()
+        self.dirty = True
+
+    def upsert_product(self, product):
+        """
+        Applique un webhook products/create ou products/update.
+        Retourne False si la version reçue est plus ancienne que celle déjà connue.
+        """
+        pid = str(product["id"])
+        existing = self.products.get(pid)
+        if existing and _is_older(product.get("updated_at"), existing.get("updated_at")):
+            return False
+        if existing:
+            self._unindex(existing)
+        self.products[pid] = product
+        self._index(product)
+        self.dirty = True
+        return True
+
+    def delete_product(self, product_id):
+        """Applique un webhook products/delete (la charge utile ne contient que l'ID)."""
+        existing = self.products.pop(str(product_id), None)
+        if existing is None:
+            return False
+        self._unindex(existing)
+        for variant in existing.get("variants", []):
+            self.inventory_levels.pop(str(variant.get("inventory_item_id")), None)
+        self.dirty = True
+        return True
+
+    def apply_inventory_level(self, level):
+        """
+        Applique un webhook inventory_levels/update et répercute la somme des
+        niveaux connus sur l'inventory_quantity de la variante correspondante.
+        """
+        item_id = str(level["inventory_item_id"])
+        location_id = str(level["location_id"])
+        levels = self.inventory_levels.setdefault(item_id, {})
+        previous = levels.get(location_id)
+        if previous and _is_older(level.get("updated_at"), previous.get("updated_at")):
+            return False
+        levels[location_id] = {"available": level.get("available"), "updated_at": level.get("updated_at")}
+
+        variant = self.find_variant_by_inventory_item(item_id)
+        if variant is not None:
+            variant["inventory_quantity"] = sum(lvl.get("available") or 0 for lvl in levels.values())
+        self.dirty = True
+        return True
+
+    def get_product(self, product_id):
+        return self.products.get(str(product_id))
+
+    def find_by_sku(self, sku):
+        pid = self._by_sku.get(sku)
+        return self.products.get(pid) if pid else None
+
+    def find_by_handle(self, handle):
+        pid = self._by_handle.get(handle)
+        return self.products.get(pid) if pid else None
+
+    def find_variant_by_inventory_item(self, inventory_item_id):
+        ref = self._by_inventory_item.get(str(inventory_item_id))
+        if not ref:
+            return None
+        pid, variant_id = ref
+        for variant in self.products.get(pid, {}).get("variants", []):
+            if str(variant.get("id")) == variant_id:
+                return variant
+        return None
+
+    def get_available(self, inventory_item_id, location_id):
+        level = self.inventory_levels.get(str(inventory_item_id), {}).get(str(location_id))
+        return level.get("available") if level else None
+
+    def _rebuild_indexes(self):
+        self._by_sku = {}
+        self._by_handle = {}
+        self._by_inventory_item = {}
+        for product in self.products.values():
+            self._index(product)
+
+    def _index(self, product):
+        pid = str(product["id"])
+        if product.get("handle"):
+            self._by_handle[product["handle"]] = pid
+        for variant in product.get("variants", []):
+            if variant.get("sku"):
+                self._by_sku[variant["sku"]] = pid
+            if variant.get("inventory_item_id"):
+                self._by_inventory_item[str(variant["inventory_item_id"])] = (pid, str(variant.get("id")))
+
+    def _unindex(self, product):
+        pid = str(product["id"])
+        if self._by_handle.get(product.get("handle")) == pid:
+            del self._by_handle[product["handle"]]
+        for variant in product.get("variants", []):
+            if self._by_sku.get(variant.get("sku")) == pid:
+                del self._by_sku[variant["sku"]]
+            item_id = str(variant.get("inventory_item_id"))
+            if self._by_inventory_item.get(item_id, (None,))[0] == pid:
+                del self._by_inventory_item[item_id]
+
+
+def _is_older(incoming, current):
+    if not incoming or not current:
+        return False
+    try:
+        return datetime.fromisoformat(incoming) < datetime.fromisoformat(current)
+    except ValueError:
+        return False
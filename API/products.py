@@ -4,20 +4,45 @@ import requests
 
 import aiohttp
 import re
-from utils import get_access_token, load_tokens, _rate_limiters, _tokens
-
-SHOPIFY_DOMAIN = "broderiedumonde.com"
-API_VERSION = "2025-01"
+from datetime import datetime, timedelta, timezone
+from urllib.parse import quote
+from utils import (
+    get_access_token,
+    get_shop,
+    get_token_count,
+    load_tokens,
+    _rate_limiters,
+    _cost_budgets,
+    _tokens,
+    PRIORITY_BACKFILL,
+    PRIORITY_CREATE,
+    PRIORITY_INVENTORY,
+    PRIORITY_PRICE,
+)
+from API.response_cache import default_cache
+from tracing import tracer
 
 load_tokens()
 
+# Boutique par défaut ; les autres boutiques sont décrites dans shops.json (voir utils.load_shops)
+SHOPIFY_DOMAIN = get_shop().domain
+API_VERSION = get_shop().api_version
+
+
+async def get_all_products(token_index=0, updated_at_min=None):
+    products, _ = await _fetch_all_products(token_index, updated_at_min)
+    return products
+
 
-async def get_all_products(token_index=0):
+async def _fetch_all_products(token_index=0, updated_at_min=None):
+    """Retourne (produits, complet) : complet est faux si la pagination s'est interrompue."""
     print('getting all products')
     access_token, token_key = get_access_token(token_index)
     await _rate_limiters[token_key].acquire()
 
     url = f"https://{SHOPIFY_DOMAIN}/admin/api/{API_VERSION}/products.json?limit=250"
+    if updated_at_min:
+        url += f"&updated_at_min={quote(updated_at_min)}"
     headers = {
         "Content-Type": "application/json",
         "X-Shopify-Access-Token": access_token
@@ -29,7 +54,7 @@ async def get_all_products(token_index=0):
         while url:
             if url in visited_urls:
                 print("Pagination arrêtée car URL déjà visitée :", url)
-                break
+                return products, False
             visited_urls.add(url)
             await _rate_limiters[token_key].acquire()
             try:
@@ -45,24 +70,86 @@ async def get_all_products(token_index=0):
                         url = None
             except Exception as e:
                 print("Exception during get_all_products:", e)
-                break
-    return products
+                return products, False
+    return products, True
 
 
-async def create_shopify_product(session, product_json, token_index=0):
+async def get_products_count(token_index=0):
     access_token, token_key = get_access_token(token_index)
-    url = f"https://{SHOPIFY_DOMAIN}/admin/api/{API_VERSION}/products.json"
+    await _rate_limiters[token_key].acquire()
+
+    url = f"https://{SHOPIFY_DOMAIN}/admin/api/{API_VERSION}/products/count.json"
+    headers = {
+        "Content-Type": "application/json",
+        "X-Shopify-Access-Token": access_token
+    }
+    async with aiohttp.ClientSession() as session:
+        try:
+            async with session.get(url, headers=headers) as response:
+                response.raise_for_status()
+                data = await response.json()
+                return data.get("count")
+        except Exception as e:
+            print("Exception during get_products_count:", e)
+            return None
+
+
+# Recouvrement appliqué à updated_at_min pour absorber un décalage d'horloge
+_SYNC_OVERLAP = timedelta(minutes=2)
+
+
+async def get_all_products_cached(token_index=0, cache=None):
+    """
+    Catalogue complet depuis le cache disque. Passé le TTL, seuls les produits
+    modifiés depuis la dernière synchronisation (updated_at_min) sont relus puis
+    fusionnés ; si le nombre de produits ne correspond plus (suppressions),
+    le catalogue est entièrement rechargé. Une liste partielle (pagination
+    interrompue) est renvoyée telle quelle mais jamais mise en cache.
+    """
+    cache = cache or default_cache
+    key = f"{SHOPIFY_DOMAIN}_products"
+    entry = cache.read(key)
+    if cache.is_fresh(entry, "products"):
+        return entry["data"]
+
+    synced_at = (datetime.now(timezone.utc) - _SYNC_OVERLAP).isoformat(timespec="seconds")
+    products = None
+    if entry and entry.get("extra", {}).get("synced_at"):
+        changed, complete = await _fetch_all_products(token_index, updated_at_min=entry["extra"]["synced_at"])
+        if complete:
+            merged = {product["id"]: product for product in entry["data"]}
+            merged.update({product["id"]: product for product in changed})
+            print(f"Synchronisation incrémentale : {len(changed)} produit(s) modifié(s)")
+            if await get_products_count(token_index) == len(merged):
+                products = list(merged.values())
+    if products is None:
+        products, complete = await _fetch_all_products(token_index)
+        if not complete:
+            print("Catalogue incomplet : cache des produits non mis à jour")
+            return products
+    cache.write(key, products, extra={"synced_at": synced_at})
+    return products
+
+
+async def create_shopify_product(session, product_json, token_index=0, shop=None, job="default"):
+    shop = shop or get_shop()
+    access_token, token_key = shop.get_access_token(token_index)
+    url = shop.url("products.json")
     headers = {
         "X-Shopify-Access-Token": access_token,
         "Content-Type": "application/json"
     }
+    await shop.rate_limiters[token_key].acquire(PRIORITY_CREATE, job=job)
     try:
-        async with session.post(url, headers=headers, json=product_json, ssl=False) as response:
+        with tracer.span("request", "http", shop=shop.name):
+            response = await session.post(url, headers=headers, json=product_json, ssl=False)
+        async with response:
             http_status = response.status
             print(f"HTTP Status Code: {http_status}")
 
             if http_status == 201:
-                return await response.json()
+                with tracer.span("response_parse", "http"):
+                    return await response.json()
             else:
                 error_text = await response.text()
                 print(f"Erreur API Shopify pour le produit : {product_json}")
@@ -73,13 +160,14 @@ async def create_shopify_product(session, product_json, token_index=0):
         return None
 
 
-async def update_shopify_product(session, product_id, product_json, token_index=0):
+async def update_shopify_product(session, product_id, product_json, token_index=0, job="default"):
     access_token, token_key = get_access_token(token_index)
     url = f"https://{SHOPIFY_DOMAIN}/admin/api/{API_VERSION}/products/{product_id}.json"
     headers = {
         "X-Shopify-Access-Token": access_token,
         "Content-Type": "application/json"
     }
+    await _rate_limiters[token_key].acquire(PRIORITY_PRICE, job=job)
     try:
         async with session.put(url, headers=headers, json=product_json, ssl=False) as response:
             http_status = response.status
@@ -111,8 +199,8 @@ async def add_linked_products_metafields(session, product_ids, token_index=0):
     for pid in product_ids:
         # Affiche l'ID courant et le nombre de frères/sœurs
         print(f"Pour le produit ID {pid} : {len(product_ids) - 1} produits liés")
-        # Dans une coroutine, on utilise asyncio.sleep et on l'attend
-        await asyncio.sleep(1)
+        # Backfill : passe après les mises à jour de stock, de prix et les créations
+        await _rate_limiters[token_key].acquire(PRIORITY_BACKFILL, job="linked_products")
 
         # Génère la liste des GID pour tous les autres produits du groupe
         siblings = [
@@ -295,35 +383,199 @@ async def get_variant_metafields(variant_id, token_index=0):
             return []
 
 
-async def delete_shopify_product(session, product_id, token_index):
+async def graphql_request(session, query, variables=None, token_index=0, estimated_cost=10, max_retries=3):
+    """
+    Envoie une requête GraphQL Admin en respectant le budget de coût du token.
+    Retourne le JSON complet (data, errors, extensions) ou None en cas d'échec HTTP.
+    Les erreurs THROTTLED sont relancées après attente de la recharge du budget.
+    """
     access_token, token_key = get_access_token(token_index)
-    print('Appel de delete_shopify_product')
-    print(product_id)
-    url = f"https://emde-b2b.myshopify.com/admin/api/2024-10/products/{product_id}.json"
+    budget = _cost_budgets[token_key]
+    url = f"https://{SHOPIFY_DOMAIN}/admin/api/{API_VERSION}/graphql.json"
+    headers = {
+        "Content-Type": "application/json",
+        "X-Shopify-Access-Token": access_token
+    }
+    payload = {"query": query, "variables": variables or {}}
+    for attempt in range(max_retries + 1):
+        await budget.acquire(estimated_cost)
+        try:
+            async with session.post(url, headers=headers, json=payload) as response:
+                if response.status >= 400:
+                    print("HTTP Error during graphql_request:", response.status, await response.text())
+                    return None
+                result = await response.json()
+        except aiohttp.ClientError as e:
+            print("Exception during graphql_request:", e)
+            return None
+
+        cost = result.get("extensions", {}).get("cost", {})
+        budget.update(cost.get("throttleStatus"))
+        errors = result.get("errors") or []
+        throttled = any(err.get("extensions", {}).get("code") == "THROTTLED" for err in errors)
+        if throttled and attempt < max_retries:
+            estimated_cost = cost.get("requestedQueryCost", estimated_cost)
+            continue
+        return result
+
+
+def _to_gid(resource, resource_id):
+    resource_id = str(resource_id)
+    return resource_id if resource_id.startswith("gid://") else f"gid://shopify/{resource}/{resource_id}"
+
+
+VARIANT_METAFIELDS_QUERY = """
+query variantMetafields($ids: [ID!]!, $first: Int!, $namespace: String) {
+  nodes(ids: $ids) {
+    ... on ProductVariant {
+      id
+      metafields(first: $first, namespace: $namespace) {
+        edges {
+          node {
+            id
+            namespace
+            key
+            value
+            type
+          }
+        }
+      }
+    }
+  }
+}
+"""
+
+# Nombre maximal d'IDs acceptés par nodes() et coût maximal d'une requête unique
+_MAX_NODES_PER_QUERY = 250
+_MAX_SINGLE_QUERY_COST = 1000
+
+
+async def iter_variant_metafields(variant_ids, token_index=0, metafields_per_variant=10, namespace=None):
+    """
+    Lit les metafields de nombreuses variantes via GraphQL nodes(ids: [...]).
+    Produit des tuples (variant_id, metafields) dans l'ordre des lots ; variant_id
+    est renvoyé tel qu'il a été fourni. La taille des lots est déduite du coût
+    demandé observé, et divisée par deux si Shopify refuse une requête trop coûteuse.
+    """
+    variant_ids = list(variant_ids)
+    # Estimation initiale : 1 point par variante + connexion metafields (2 + first)
+    cost_per_variant = 1 + 2 + metafields_per_variant
+    position = 0
+    async with aiohttp.ClientSession() as session:
+        while position < len(variant_ids):
+            batch_size = max(1, min(_MAX_NODES_PER_QUERY, int(_MAX_SINGLE_QUERY_COST // cost_per_variant)))
+            batch = variant_ids[position:position + batch_size]
+            gids = {_to_gid("ProductVariant", vid): vid for vid in batch}
+            variables = {"ids": list(gids), "first": metafields_per_variant, "namespace": namespace}
+            result = await graphql_request(
+                session,
+                VARIANT_METAFIELDS_QUERY,
+                variables,
+                token_index=token_index,
+                estimated_cost=cost_per_variant * len(batch),
+            )
+            if result is None:
+                print(f"Lot de variantes ignoré après erreur HTTP ({len(batch)} variantes)")
+                position += len(batch)
+                continue
+
+            errors = result.get("errors") or []
+            if any(err.get("extensions", {}).get("code") == "MAX_COST_EXCEEDED" for err in errors) and len(batch) > 1:
+                cost_per_variant *= 2
+                continue
+            if errors and not result.get("data"):
+                print("GraphQL errors during iter_variant_metafields:", errors)
+                position += len(batch)
+                continue
+
+            requested = result.get("extensions", {}).get("cost", {}).get("requestedQueryCost")
+            if requested:
+                cost_per_variant = max(1.0, requested / len(batch))
+
+            for node in result.get("data", {}).get("nodes", []):
+                if not node:
+                    continue
+                metafields = [edge["node"] for edge in node.get("metafields", {}).get("edges", [])]
+                yield gids.get(node["id"], node["id"]), metafields
+            position += len(batch)
+
+
+async def delete_shopify_product(session, product_id, token_index=0, max_retries=3):
+    access_token, token_key = get_access_token(token_index)
+    url = f"https://{SHOPIFY_DOMAIN}/admin/api/{API_VERSION}/products/{product_id}.json"
     headers = {
         "X-Shopify-Access-Token": access_token,
         "Content-Type": "application/json"
     }
-    try:
-        async with session.delete(url, headers=headers, ssl=False) as response:
-            http_status = response.status
-            print(f"HTTP Status Code: {http_status}")
-
-            if http_status == 200:
-                # En cas de succès, Shopify renvoie généralement une réponse vide ou un message de confirmation
-                print(f"Produit avec l'ID {product_id} supprimé avec succès.")
-                return True
-            else:
+    for attempt in range(max_retries + 1):
+        await _rate_limiters[token_key].acquire()
+        try:
+            async with session.delete(url, headers=headers, ssl=False) as response:
+                http_status = response.status
+                print(f"HTTP Status Code: {http_status}")
+
+                if http_status == 200:
+                    # En cas de succès, Shopify renvoie généralement une réponse vide ou un message de confirmation
+                    print(f"Produit avec l'ID {product_id} supprimé avec succès.")
+                    return True
+                if http_status == 404:
+                    # Déjà supprimé (ex. relance d'une purge interrompue)
+                    print(f"Produit avec l'ID {product_id} introuvable, considéré comme supprimé.")
+                    return True
+                if http_status == 429 and attempt < max_retries:
+                    retry_after = float(response.headers.get("Retry-After", 2.0))
+                    await asyncio.sleep(retry_after)
+                    continue
                 error_text = await response.text()
                 print(f"Erreur API Shopify lors de la suppression du produit ID {product_id} : {error_text}")
                 return False
-    except aiohttp.ClientError as e:
-        print(f"Erreur de requête lors de la suppression du produit ID {product_id} : {e}")
-        return False
+        except aiohttp.ClientError as e:
+            print(f"Erreur de requête lors de la suppression du produit ID {product_id} : {e}")
+            return False
+    return False
+
+
+async def delete_shopify_products(product_ids, workers_per_token=2):
+    """
+    Supprime une liste de produits en parallèle en répartissant les appels sur tous
+    les tokens disponibles ; chaque token reste soumis à son propre rate limiter.
+    Retourne un dictionnaire {product_id: True/False}.
+    """
+    queue = asyncio.Queue()
+    for pid in product_ids:
+        queue.put_nowait(pid)
+    results = {}
 
+    async def worker(session, token_index):
+        while True:
+            try:
+                pid = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            results[pid] = await delete_shopify_product(session, pid, token_index)
+            done = len(results)
+            if done % 100 == 0:
+                print(f"Suppression : {done}/{len(product_ids)} produits traités")
 
-async def update_stock(inventory_item_id, stock, token_index):
+    async with aiohttp.ClientSession() as session:
+        workers = [
+            worker(session, token_index)
+            for token_index in range(get_token_count())
+            for _ in range(workers_per_token)
+        ]
+        await asyncio.gather(*workers)
+    return results
+
+
+async def update_stock(inventory_item_id, stock, token_index, job="stock", store=None):
+    """
+    Fixe le stock d'un inventory item. Avec un ProductStore (tenu à jour par
+    API/webhooks.py), l'écriture est évitée si le niveau connu est déjà le bon,
+    et le store est mis à jour après un envoi réussi.
+    """
     location_id = 100888019208
+    if store is not None and store.get_available(inventory_item_id, location_id) == stock:
+        return {"inventory_level": {"inventory_item_id": inventory_item_id, "location_id": location_id, "available": stock}}
     access_token, token_key = get_access_token(token_index)
 
     stock_data = {
@@ -337,9 +589,14 @@ async def update_stock(inventory_item_id, stock, token_index):
         "Content-Type": "application/json"
     }
 
+    await _rate_limiters[token_key].acquire(PRIORITY_INVENTORY, job=job)
     try:
-        response = requests.post(url, json=stock_data, headers=headers)
-        return response.json()
+        # requests est bloquant : exécuté dans un thread pour ne pas figer les autres jobs de la boucle
+        response = await asyncio.to_thread(requests.post, url, json=stock_data, headers=headers)
+        data = response.json()
+        if store is not None and response.ok and data.get("inventory_level"):
+            store.apply_inventory_level(data["inventory_level"])
+        return data
 
     except Exception as e:
         print(e)
@@ -0,0 +1,88 @@
+import os
+import re
+import json
+import time
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'cache')
+
+# Durée de validité (secondes) par ressource ; au-delà, une relecture conditionnelle est faite
+DEFAULT_TTLS = {
+    "smart_collections": 3600,
+    "locations": 24 * 3600,
+    "shop": 24 * 3600,
+    "products": 15 * 60,
+}
+
+
+class ResponseCache:
+    """
+    Cache disque des réponses de l'API pour les ressources qui changent peu.
+    Une entrée par fichier JSON : données, date de récupération, ETag éventuel
+    et informations complémentaires (ex. date de dernière synchronisation).
+    """
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, ttls=None):
+        self.directory = directory
+        self.ttls = dict(DEFAULT_TTLS, **(ttls or {}))
+
+    def _path(self, key):
+        return os.path.join(self.directory, re.sub(r"[^\w.\-]", "_", key) + ".json")
+
+    def read(self, key):
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            # Fichier corrompu : on le traite comme absent
+            return None
+
+    def write(self, key, data, etag=None, extra=None):
+        os.makedirs(self.directory, exist_ok=True)
+        entry = {"fetched_at": time.time(), "etag": etag, "extra": extra or {}, "data": data}
+        path = self._path(key)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        return entry
+
+    def touch(self, key, entry):
+        return self.write(key, entry["data"], entry.get("etag"), entry.get("extra"))
+
+    def invalidate(self, key):
+        path = self._path(key)
+        if os.path.exists(path):
+            os.remove(path)
+
+    def is_fresh(self, entry, resource):
+        ttl = self.ttls.get(resource, 0)
+        return entry is not None and time.time() - entry.get("fetched_at", 0) < ttl
+
+    async def get_json(self, session, url, headers, resource, key, limiter=None):
+        """
+        GET mis en cache : renvoie l'entrée locale tant qu'elle est fraîche, sinon
+        relit avec If-None-Match quand un ETag est connu (304 = réutilisation).
+        """
+        entry = self.read(key)
+        if self.is_fresh(entry, resource):
+            return entry["data"]
+
+        request_headers = dict(headers)
+        if entry and entry.get("etag"):
+            request_headers["If-None-Match"] = entry["etag"]
+        if limiter is not None:
+            await limiter.acquire()
+        async with session.get(url, headers=request_headers) as response:
+            if response.status == 304 and entry:
+                self.touch(key, entry)
+                return entry["data"]
+            response.raise_for_status()
+            data = await response.json()
+            self.write(key, data, response.headers.get("ETag"))
+            return data
+
+
+default_cache = ResponseCache()
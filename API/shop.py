@@ -0,0 +1,41 @@
+import os
+import sys
+
+import aiohttp
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from utils import get_access_token, load_tokens, _rate_limiters
+from API.products import SHOPIFY_DOMAIN, API_VERSION
+from API.response_cache import default_cache
+
+load_tokens()
+
+
+async def _get_cached_resource(resource, token_index=0, use_cache=True):
+    access_token, token_key = get_access_token(token_index)
+    url = f"https://{SHOPIFY_DOMAIN}/admin/api/{API_VERSION}/{resource}.json"
+    headers = {
+        "X-Shopify-Access-Token": access_token,
+        "Content-Type": "application/json"
+    }
+    key = f"{SHOPIFY_DOMAIN}_{resource}"
+    if not use_cache:
+        default_cache.invalidate(key)
+    async with aiohttp.ClientSession() as session:
+        try:
+            return await default_cache.get_json(
+                session, url, headers, resource, key, limiter=_rate_limiters[token_key]
+            )
+        except Exception as e:
+            print(f"Exception during get {resource}:", e)
+            return {}
+
+
+async def get_locations(token_index=0, use_cache=True):
+    data = await _get_cached_resource("locations", token_index, use_cache)
+    return data.get("locations", [])
+
+
+async def get_shop_metadata(token_index=0, use_cache=True):
+    data = await _get_cached_resource("shop", token_index, use_cache)
+    return data.get("shop", {})
@@ -0,0 +1,176 @@
+import os
+import sys
+import hmac
+import json
+import base64
+import asyncio
+import hashlib
+import argparse
+from collections import deque
+
+import aiohttp
+from aiohttp import web
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from utils import get_access_token, load_tokens, _rate_limiters
+from API.products import SHOPIFY_DOMAIN, API_VERSION, get_all_products
+from API.product_store import ProductStore, DEFAULT_STORE_FILE
+
+WEBHOOK_TOPICS = (
+    "products/create",
+    "products/update",
+    "products/delete",
+    "inventory_levels/update",
+)
+
+# Nombre d'identifiants de webhooks mémorisés pour ignorer les livraisons en double
+_SEEN_WEBHOOKS_MAX = 10000
+# Délai entre deux sauvegardes du store sur disque
+_FLUSH_INTERVAL = 5.0
+
+
+def verify_webhook_hmac(secret, body, hmac_header):
+    """Vérifie la signature X-Shopify-Hmac-Sha256 (HMAC-SHA256 du corps brut, encodé en base64)."""
+    if not secret or not hmac_header:
+        return False
+    digest = hmac.new(secret.encode("utf-8"), body, hashlib.sha256).digest()
+    expected = base64.b64encode(digest).decode("ascii")
+    return hmac.compare_digest(expected, hmac_header)
+
+
+def apply_webhook(store, topic, payload):
+    """Applique le delta d'un webhook au store local. Retourne True si le store a changé."""
+    if topic in ("products/create", "products/update"):
+        return store.upsert_product(payload)
+    if topic == "products/delete":
+        return store.delete_product(payload["id"])
+    if topic == "inventory_levels/update":
+        return store.apply_inventory_level(payload)
+    print(f"Webhook ignoré, topic non géré : {topic}")
+    return False
+
+
+def create_webhook_app(store, secret, path="/webhooks"):
+    seen_ids = set()
+    seen_order = deque()
+
+    async def handle_webhook(request):
+        body = await request.read()
+        if not verify_webhook_hmac(secret, body, request.headers.get("X-Shopify-Hmac-Sha256")):
+            print("Webhook rejeté : signature HMAC invalide")
+            return web.Response(status=401)
+
+        webhook_id = request.headers.get("X-Shopify-Webhook-Id")
+        if webhook_id and webhook_id in seen_ids:
+            return web.Response(status=200)
+
+        topic = request.headers.get("X-Shopify-Topic", "")
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            return web.Response(status=400)
+
+        try:
+            changed = apply_webhook(store, topic, payload)
+        except (KeyError, TypeError, ValueError) as e:
+            # Pas d'enregistrement de l'ID : Shopify renverra le webhook
+            print(f"Erreur lors de l'application du webhook {topic} : {e}")
+            return web.Response(status=500)
+        print(f"Webhook {topic} reçu ({'appliqué' if changed else 'ignoré'})")
+
+        # L'ID n'est mémorisé qu'une fois le delta appliqué
+        if webhook_id:
+            seen_ids.add(webhook_id)
+            seen_order.append(webhook_id)
+            if len(seen_order) > _SEEN_WEBHOOKS_MAX:
+                seen_ids.discard(seen_order.popleft())
+        # Shopify attend une réponse rapide : la sauvegarde est différée
+        return web.Response(status=200)
+
+    async def flush_periodically(app):
+        try:
+            while True:
+                await asyncio.sleep(_FLUSH_INTERVAL)
+                if store.dirty:
+                    store.save()
+        except asyncio.CancelledError:
+            pass
+
+    async def on_startup(app):
+        app["flush_task"] = asyncio.create_task(flush_periodically(app))
+
+    async def on_cleanup(app):
+        app["flush_task"].cancel()
+        await app["flush_task"]
+        if store.dirty:
+            store.save()
+
+    app = web.Application()
+    app["store"] = store
+    app.router.add_post(path, handle_webhook)
+    app.on_startup.append(on_startup)
+    app.on_cleanup.append(on_cleanup)
+    return app
+
+
+async def register_webhooks(address, topics=WEBHOOK_TOPICS, token_index=0):
+    """Abonne l'adresse publique du récepteur aux topics donnés (API REST webhooks)."""
+    access_token, token_key = get_access_token(token_index)
+    url = f"https://{SHOPIFY_DOMAIN}/admin/api/{API_VERSION}/webhooks.json"
+    headers = {
+        "X-Shopify-Access-Token": access_token,
+        "Content-Type": "application/json"
+    }
+    results = []
+    async with aiohttp.ClientSession() as session:
+        for topic in topics:
+            await _rate_limiters[token_key].acquire()
+            payload = {"webhook": {"topic": topic, "address": address, "format": "json"}}
+            try:
+                async with session.post(url, headers=headers, json=payload) as response:
+                    if response.status == 201:
+                        data = await response.json()
+                        print(f"Webhook {topic} enregistré : {data.get('webhook', {}).get('id')}")
+                        results.append(data.get("webhook"))
+                    else:
+                        error_text = await response.text()
+                        print(f"Erreur lors de l'enregistrement du webhook {topic} : {error_text}")
+            except aiohttp.ClientError as e:
+                print(f"Erreur de requête lors de l'enregistrement du webhook {topic} : {e}")
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Récepteur de webhooks Shopify maintenant un catalogue local à jour.")
+    parser.add_argument("--host", default="0.0.0.0", help="Adresse d'écoute")
+    parser.add_argument("--port", type=int, default=8080, help="Port d'écoute")
+    parser.add_argument("--store", default=DEFAULT_STORE_FILE, help="Fichier JSON du catalogue local")
+    parser.add_argument(
+        "--secret",
+        default=os.environ.get("SHOPIFY_WEBHOOK_SECRET"),
+        help="Secret de signature des webhooks (par défaut : $SHOPIFY_WEBHOOK_SECRET)",
+    )
+    parser.add_argument("--seed", action="store_true", help="Télécharge le catalogue complet une fois avant d'écouter")
+    parser.add_argument("--register", metavar="URL", help="Abonne cette URL publique aux topics gérés puis quitte")
+    parser.add_argument("--token-index", type=int, default=0, help="Index du token Shopify à utiliser")
+
+    args = parser.parse_args()
+    load_tokens()
+
+    if args.register:
+        asyncio.run(register_webhooks(args.register, token_index=args.token_index))
+        return
+    if not args.secret:
+        parser.error("un secret de webhook est requis (--secret ou SHOPIFY_WEBHOOK_SECRET)")
+
+    store = ProductStore(args.store).load()
+    if args.seed:
+        store.seed(asyncio.run(get_all_products(token_index=args.token_index)))
+        store.save()
+    print(f"Catalogue local : {len(store.products)} produits")
+
+    web.run_app(create_webhook_app(store, args.secret), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
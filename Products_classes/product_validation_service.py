@@ -0,0 +1,172 @@
+import csv
+import json
+import re
+
+
+# Limites documentées par Shopify pour l'API Admin
+MAX_TITLE_LENGTH = 255
+MAX_HANDLE_LENGTH = 255
+MAX_TAGS = 250
+MAX_TAG_LENGTH = 255
+MAX_VARIANTS = 100
+MAX_IMAGES = 250
+MAX_SKU_LENGTH = 255
+
+_DECIMAL_RE = re.compile(r"^-?\d+(\.\d+)?$")
+_INTEGER_RE = re.compile(r"^-?\d+$")
+_METAFIELD_KEY_RE = re.compile(r"^[A-Za-z0-9_\-]+$")
+
+
+def _is_valid_ean13(value):
+    if not re.fullmatch(r"\d{13}", value):
+        return False
+    digits = [int(c) for c in value]
+    checksum = sum(d * (3 if i % 2 else 1) for i, d in enumerate(digits[:12]))
+    return (10 - checksum % 10) % 10 == digits[12]
+
+
+def _is_json_list(value):
+    try:
+        return isinstance(json.loads(value), list)
+    except (TypeError, ValueError):
+        return False
+
+
+def _is_json(value):
+    try:
+        json.loads(value)
+        return True
+    except (TypeError, ValueError):
+        return False
+
+
+# Type de metafield -> contrôle de la valeur (chaîne envoyée à Shopify)
+METAFIELD_VALUE_CHECKS = {
+    "single_line_text_field": lambda v: "\n" not in v,
+    "multi_line_text_field": lambda v: True,
+    "number_decimal": lambda v: bool(_DECIMAL_RE.match(v)),
+    "number_integer": lambda v: bool(_INTEGER_RE.match(v)),
+    "boolean": lambda v: v in ("true", "false"),
+    "json": _is_json,
+    "url": lambda v: v.startswith(("http://", "https://")),
+    "list.product_reference": _is_json_list,
+    "list.single_line_text_field": _is_json_list,
+}
+
+
+class ProductValidationService:
+    """
+    Contrôle local des payloads produit avant envoi, pour ne pas dépenser de
+    budget API sur des lignes que Shopify refuserait (422).
+    Les handles en collision dans le lot sont suffixés (-1, -2, …) comme le ferait Shopify.
+    """
+
+    def __init__(self, existing_handles=None):
+        self.used_handles = set(existing_handles or [])
+        self.rejects = []
+
+    def validate(self, payload, label):
+        """Retourne la liste des erreurs du payload (vide si envoyable) ; corrige le handle si besoin."""
+        product = payload.get("product", {})
+        errors = []
+
+        title = product.get("title") or ""
+        if not title.strip():
+            errors.append("titre vide")
+        elif len(title) > MAX_TITLE_LENGTH:
+            errors.append(f"titre trop long ({len(title)} > {MAX_TITLE_LENGTH})")
+
+        for field in ("vendor", "product_type"):
+            if len(product.get(field) or "") > 255:
+                errors.append(f"{field} trop long")
+
+        tags = [t for t in (product.get("tags") or "").split(",") if t.strip()]
+        if len(tags) > MAX_TAGS:
+            errors.append(f"trop de tags ({len(tags)} > {MAX_TAGS})")
+        long_tags = [t.strip() for t in tags if len(t.strip()) > MAX_TAG_LENGTH]
+        if long_tags:
+            errors.append(f"{len(long_tags)} tag(s) de plus de {MAX_TAG_LENGTH} caractères")
+
+        variants = product.get("variants") or []
+        if len(variants) > MAX_VARIANTS:
+            errors.append(f"trop de variantes ({len(variants)} > {MAX_VARIANTS})")
+        for variant in variants:
+            errors.extend(self._validate_variant(variant))
+
+        images = product.get("images") or []
+        if len(images) > MAX_IMAGES:
+            errors.append(f"trop d'images ({len(images)} > {MAX_IMAGES})")
+        for image in images:
+            if not str(image.get("src", "")).startswith(("http://", "https://")):
+                errors.append(f"URL d'image invalide : {image.get('src')}")
+
+        for metafield in product.get("metafields") or []:
+            errors.extend(self._validate_metafield(metafield))
+
+        if errors:
+            self.rejects.append((label, errors))
+            return errors
+
+        product["handle"] = self._unique_handle(product.get("handle") or "")
+        return errors
+
+    def filter(self, prepared):
+        """Ne conserve que les (payload, label) envoyables ; les rejets sont mémorisés dans self.rejects."""
+        return [(payload, label) for payload, label in prepared if not self.validate(payload, label)]
+
+    def write_rejects(self, path):
+        with open(path, "w", encoding="utf-8", newline="") as handle:
+            writer = csv.writer(handle, delimiter=";")
+            writer.writerow(["Produit", "Erreurs"])
+            for label, errors in self.rejects:
+                writer.writerow([label, " | ".join(errors)])
+
+    def _unique_handle(self, handle):
+        if not handle:
+            # Shopify générera le handle à partir du titre
+            return handle
+        base = handle[:MAX_HANDLE_LENGTH]
+        candidate = base
+        suffix = 1
+        while candidate in self.used_handles:
+            tail = f"-{suffix}"
+            candidate = f"{base[:MAX_HANDLE_LENGTH - len(tail)]}{tail}"
+            suffix += 1
+        self.used_handles.add(candidate)
+        return candidate
+
+    @staticmethod
+    def _validate_variant(variant):
+        errors = []
+        price = str(variant.get("price", ""))
+        if not _DECIMAL_RE.match(price) or float(price) < 0:
+            errors.append(f"prix invalide : {price!r}")
+        if len(variant.get("sku") or "") > MAX_SKU_LENGTH:
+            errors.append("SKU trop long")
+        barcode = variant.get("barcode")
+        if barcode and not _is_valid_ean13(barcode):
+            errors.append(f"EAN 13 invalide : {barcode!r}")
+        return errors
+
+    @staticmethod
+    def _validate_metafield(metafield):
+        errors = []
+        name = f"{metafield.get('namespace')}.{metafield.get('key')}"
+        namespace = metafield.get("namespace") or ""
+        key = metafield.get("key") or ""
+        if not 3 <= len(namespace) <= 255:
+            errors.append(f"namespace de metafield invalide : {name}")
+        if not 2 <= len(key) <= 64 or not _METAFIELD_KEY_RE.match(key):
+            errors.append(f"clé de metafield invalide : {name}")
+
+        value = metafield.get("value")
+        value = "" if value is None else str(value)
+        if not value.strip():
+            errors.append(f"valeur vide pour le metafield {name}")
+            return errors
+        check = METAFIELD_VALUE_CHECKS.get(metafield.get("type"))
+        if check is None:
+            errors.append(f"type de metafield non géré : {metafield.get('type')} ({name})")
+        elif not check(value):
+            errors.append(f"valeur incompatible avec le type {metafield.get('type')} pour {name} : {value[:50]!r}")
+        return errors
@@ -0,0 +1,161 @@
+"""
+Nettoyage vectorisé des colonnes des CSV fournisseurs (dépendance optionnelle : pandas).
+
+Produit, colonne par colonne, les mêmes valeurs que _clean_row d'import_products
+(_clean_decimal, _clean_weight_in_grams, _clean_int, _sanitize_identifier), mais
+sur des blocs de lignes entiers au lieu d'appels Python cellule par cellule.
+Écarts volontaires, là où le chemin ligne à ligne produit une valeur inutilisable :
+un poids "nan" donne None (et non NaN), et une quantité "inf" donne None là où
+_clean_int lève OverflowError.
+"""
+from pathlib import Path
+from typing import Callable, Dict, Iterator, Optional, Tuple
+
+try:
+    import numpy as np
+    import pandas as pd
+except ImportError:
+    np = None
+    pd = None
+
+DEFAULT_CHUNKSIZE = 50_000
+# int64 déborde à partir de 2**63
+_INT64_LIMIT = 2.0 ** 63
+
+
+def is_available() -> bool:
+    return pd is not None
+
+
+def _on_uniques(series: "pd.Series", transform: Callable[["pd.Series"], "pd.Series"]) -> "pd.Series":
+    # Les colonnes prix / poids / stock / TVA / état comptent peu de valeurs distinctes :
+    # la transformation ne s'applique qu'à celles-ci, puis est redistribuée par codes (hachage en C)
+    codes, uniques = pd.factorize(series.fillna("").astype(object))
+    transformed = transform(pd.Series(uniques, dtype=object))
+    return transformed.take(codes).set_axis(series.index)
+
+
+def _normalize(series: "pd.Series") -> "pd.Series":
+    return series.str.replace("\u00a0", " ", regex=False).str.strip()
+
+
+def _python_float(value: str) -> Optional[float]:
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+def _to_float(normalized: "pd.Series") -> "pd.Series":
+    # float() sur les seules valeurs distinctes : to_numeric n'arrondit pas comme lui
+    # (ex. "0.30000000000000004" -> 0.3), or la valeur part telle quelle dans le payload
+    numbers = normalized.where(normalized != "").map(_python_float, na_action="ignore")
+    return numbers.astype("float64")
+
+
+def _format_decimal(text: str) -> Optional[str]:
+    value = _python_float(text) if text else None
+    return None if value is None else f"{value:.2f}"
+
+
+def _decimal_values(uniques: "pd.Series") -> "pd.Series":
+    normalized = _normalize(uniques).str.replace(" ", "", regex=False).str.replace(",", ".", regex=False)
+    return normalized.map(_format_decimal).astype(object)
+
+
+def _weight_values(uniques: "pd.Series") -> "pd.Series":
+    return _to_float(_normalize(uniques).str.replace(",", ".", regex=False))
+
+
+def _int_values(uniques: "pd.Series") -> "pd.Series":
+    normalized = _normalize(uniques).str.replace(",", ".", regex=False)
+    numbers = _to_float(normalized)
+    finite = numbers.where(np.isfinite(numbers))
+    in_range = finite.abs() < _INT64_LIMIT
+    values = pd.Series(None, index=uniques.index, dtype=object)
+    values[in_range] = np.trunc(finite[in_range].to_numpy()).astype("int64").tolist()
+    # Au-delà d'int64 (ex. "9999999999999999999" issu d'un tableur) : entier Python, comme _clean_int
+    out_of_range = finite.notna() & ~in_range
+    if out_of_range.any():
+        values[out_of_range] = [int(_python_float(text)) for text in normalized[out_of_range]]
+    return values
+
+
+def clean_decimal_column(series: "pd.Series") -> "pd.Series":
+    """Équivalent de _clean_decimal : chaîne à deux décimales ou None."""
+    return _on_uniques(series, _decimal_values)
+
+
+def clean_weight_column(series: "pd.Series") -> "pd.Series":
+    """Équivalent de _clean_weight_in_grams : float ou NaN."""
+    return _on_uniques(series, _weight_values)
+
+
+def clean_int_column(series: "pd.Series") -> "pd.Series":
+    """Équivalent de _clean_int : entier Python tronqué vers zéro ou None."""
+    return _on_uniques(series, _int_values)
+
+
+def sanitize_identifier_column(series: "pd.Series") -> "pd.Series":
+    """Équivalent de _sanitize_identifier."""
+    return series.fillna("").astype(str).str.strip().str.lstrip("#").str.strip()
+
+
+def strip_column(series: "pd.Series") -> "pd.Series":
+    return _on_uniques(series, lambda uniques: uniques.str.strip())
+
+
+def status_column(series: "pd.Series") -> "pd.Series":
+    """Etat « affiché » -> active, sinon draft."""
+    return _on_uniques(
+        series,
+        lambda uniques: (uniques.str.strip().str.lower() == "affiché").map({True: "active", False: "draft"}),
+    )
+
+
+def clean_frame(frame: "pd.DataFrame") -> "pd.DataFrame":
+    """Calcule les colonnes nettoyées attendues par _build_product_payload(row, cleaned)."""
+    empty = pd.Series("", index=frame.index, dtype=object)
+
+    def column(name: str) -> "pd.Series":
+        return frame[name] if name in frame.columns else empty
+
+    quantity = clean_int_column(column("Quantité"))
+    stock = clean_int_column(column("Nombre de produits en stock"))
+    # Même logique que `a or b or 0` : 0 et valeur absente passent à la colonne suivante
+    quantity = quantity.where(quantity.fillna(0) != 0, stock)
+    quantity = quantity.where(quantity.fillna(0) != 0, 0)
+
+    price_ttc = clean_decimal_column(column("Prix du produit (TTC hors remise)"))
+
+    cleaned = pd.DataFrame(
+        {
+            "product_id": sanitize_identifier_column(column("ID produit")),
+            "weight": clean_weight_column(column("Poids")),
+            "quantity": quantity,
+            "price_ttc": price_ttc.where(price_ttc.notna(), "0.00"),
+            "purchase_price_ht": clean_decimal_column(column("Prix d'achat HT du produit")),
+            "vat_rate": strip_column(column("Taux de tva")),
+            "status": status_column(column("Etat")),
+        },
+        index=frame.index,
+    )
+    # Valeurs Python natives (None plutôt que NaN) pour rester sérialisables en JSON
+    return cleaned.astype(object).where(cleaned.notna(), None)
+
+
+def iter_cleaned_rows(csv_path: Path, chunksize: int = DEFAULT_CHUNKSIZE) -> Iterator[Tuple[Dict[str, str], Dict]]:
+    """Lit le CSV (séparateur ';') par blocs et produit des couples (ligne brute, valeurs nettoyées)."""
+    if pd is None:
+        raise RuntimeError("pandas est requis pour le nettoyage vectorisé (pip install pandas)")
+    reader = pd.read_csv(
+        csv_path,
+        sep=";",
+        encoding="utf-8-sig",
+        dtype=str,
+        keep_default_na=False,
+        chunksize=chunksize,
+    )
+    for chunk in reader:
+        cleaned = clean_frame(chunk)
+        yield from zip(chunk.to_dict("records"), cleaned.to_dict("records"))
@@ -1,18 +1,25 @@
 import argparse
 import asyncio
+import cProfile
 import csv
+import pstats
 import re
 import unicodedata
 from pathlib import Path
-from typing import Dict, Iterable, List, Optional, Tuple
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 
 import aiohttp
 
+import columnar_cleaning
+from API.product_store import ProductStore
 from API.products import create_shopify_product
 from Products_classes.image_service import ImageService
 from Products_classes.product import Product
 from Products_classes.product_generation_service import ProductGenerationService
+from Products_classes.product_validation_service import ProductValidationService
 from Products_classes.tag_service import TagService
+from tracing import tracer
+from utils import ShopConfig, get_shop
 
 
 def _normalize_whitespace(value: str) -> str:
@@ -83,8 +90,23 @@ def _split_to_list(value: str) -> List[str]:
     return [item.strip() for item in value.split(";") if item.strip()]
 
 
-def _build_product_payload(row: Dict[str, str]) -> Tuple[Dict, str]:
-    product_id = _sanitize_identifier(row.get("ID produit", ""))
+def _clean_row(row: Dict[str, str]) -> Dict:
+    etat = row.get("Etat", "").strip().lower()
+    return {
+        "product_id": _sanitize_identifier(row.get("ID produit", "")),
+        "weight": _clean_weight_in_grams(row.get("Poids", "")),
+        "quantity": _clean_int(row.get("Quantité", "")) or _clean_int(row.get("Nombre de produits en stock", "")) or 0,
+        "price_ttc": _clean_decimal(row.get("Prix du produit (TTC hors remise)", "")) or "0.00",
+        "purchase_price_ht": _clean_decimal(row.get("Prix d'achat HT du produit", "")),
+        "vat_rate": row.get("Taux de tva", "").strip(),
+        "status": "active" if etat == "affiché" else "draft",
+    }
+
+
+def _build_product_payload(row: Dict[str, str], cleaned: Optional[Dict] = None) -> Tuple[Dict, str]:
+    if cleaned is None:
+        cleaned = _clean_row(row)
+    product_id = cleaned["product_id"]
     sku = row.get("Référence du produit", "").strip()
     vendor = row.get("Nom du fournisseur", "").strip()
     ean13 = row.get("EAN 13", "").strip()
@@ -93,20 +115,18 @@ def _build_product_payload(row: Dict[str, str]) -> Tuple[Dict, str]:
     short_description = row.get("Description courte", "").strip()
     keywords = row.get("Mots clés", "")
     features = row.get("Caractéristiques", "")
-    weight_value = _clean_weight_in_grams(row.get("Poids", ""))
-    quantity = _clean_int(row.get("Quantité", "")) or _clean_int(row.get("Nombre de produits en stock", "")) or 0
-    price_ttc = _clean_decimal(row.get("Prix du produit (TTC hors remise)", "")) or "0.00"
-    purchase_price_ht = _clean_decimal(row.get("Prix d'achat HT du produit", ""))
-    vat_rate = row.get("Taux de tva", "").strip()
+    weight_value = cleaned["weight"]
+    quantity = cleaned["quantity"]
+    price_ttc = cleaned["price_ttc"]
+    purchase_price_ht = cleaned["purchase_price_ht"]
+    vat_rate = cleaned["vat_rate"]
     sous_categorie = row.get("Sous-catégorie principale", "").strip()
     categorie = row.get("Catégorie", "") or row.get("Catégorie principale parente", "")
     categorie_parente = row.get("Catégorie principale parente", "").strip()
     brand_name = row.get("Nom Marque", "").strip()
     page_title = row.get("Titre de la page", "").strip()
     meta_description = row.get("Méta description", "").strip()
-    etat = row.get("Etat", "").strip().lower()
-
-    status = "active" if etat == "affiché" else "draft"
+    status = cleaned["status"]
     product_type = sous_categorie or categorie_parente or "Divers"
 
     product = Product(
@@ -199,24 +219,101 @@ def _read_csv_rows(csv_path: Path) -> Iterable[Dict[str, str]]:
             yield row
 
 
-async def import_products(csv_path: Path, token_index: int = 0, limit: Optional[int] = None) -> None:
-    rows = _read_csv_rows(csv_path)
+def _traced_rows(rows: Iterable) -> Iterator:
+    iterator = iter(rows)
+    while True:
+        with tracer.span("row_read"):
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        yield item
+
+
+def _exists_in_store(store: ProductStore, payload: Dict) -> bool:
+    product_payload = payload.get("product", {})
+    handle = product_payload.get("handle")
+    if handle and store.find_by_handle(handle):
+        return True
+    return any(
+        variant.get("sku") and store.find_by_sku(variant["sku"])
+        for variant in product_payload.get("variants", [])
+    )
+
+
+async def import_products(
+    csv_path: Path,
+    token_index: int = 0,
+    limit: Optional[int] = None,
+    store: Optional[ProductStore] = None,
+    rejects_path: Optional[Path] = None,
+    vectorized: bool = False,
+    shops: Optional[List[str]] = None,
+) -> Dict[str, Dict[str, Optional[int]]]:
+    """
+    Prépare et valide les produits une seule fois, puis les publie en parallèle
+    sur chaque boutique demandée (boutique par défaut si aucune).
+    Retourne, par boutique, l'ID Shopify créé pour chaque produit, indexé par handle
+    (None en cas d'échec).
+    """
+    if vectorized:
+        rows = columnar_cleaning.iter_cleaned_rows(csv_path)
+    else:
+        rows = ((row, None) for row in _read_csv_rows(csv_path))
     prepared: List[Tuple[Dict, str]] = []
-    for idx, row in enumerate(rows):
+    for idx, (row, cleaned) in enumerate(_traced_rows(rows)):
         if limit is not None and idx >= limit:
             break
-        payload, label = _build_product_payload(row)
+        with tracer.span("build"):
+            payload, label = _build_product_payload(row, cleaned)
+        if store is not None and _exists_in_store(store, payload):
+            print(f"Produit déjà présent dans le catalogue local, ignoré : {label}")
+            continue
         prepared.append((payload, label))
 
+    existing_handles = {p.get("handle") for p in store.products.values()} if store is not None else None
+    validation_service = ProductValidationService(existing_handles)
+    with tracer.span("validate", products=len(prepared)):
+        prepared = validation_service.filter(prepared)
+    if validation_service.rejects:
+        print(f"{len(validation_service.rejects)} produit(s) rejeté(s) avant envoi")
+        if rejects_path is not None:
+            validation_service.write_rejects(rejects_path)
+            print(f"Rejets écrits dans {rejects_path}")
+
+    shop_configs = [get_shop(name) for name in shops] if shops else [get_shop()]
+    results = await asyncio.gather(
+        *(_publish_to_shop(prepared, shop, token_index, job=f"import:{csv_path.name}") for shop in shop_configs)
+    )
+    for shop, shop_results in zip(shop_configs, results):
+        created = sum(1 for product_id in shop_results.values() if product_id)
+        print(f"[{shop.name}] {created}/{len(shop_results)} produit(s) créé(s)")
+    return {shop.name: shop_results for shop, shop_results in zip(shop_configs, results)}
+
+
+async def _publish_to_shop(
+    prepared: List[Tuple[Dict, str]],
+    shop: ShopConfig,
+    token_index: int,
+    job: str = "import",
+) -> Dict[str, Optional[int]]:
+    results: Dict[str, Optional[int]] = {}
     async with aiohttp.ClientSession() as session:
-        for payload, label in prepared:
-            print(f"Création du produit Shopify : {label}")
-            response = await create_shopify_product(session, payload, token_index=token_index)
+        for position, (payload, label) in enumerate(prepared):
+            # Deux produits peuvent avoir le même titre : le handle, rendu unique par la
+            # validation, sert de clé (position dans le lot quand Shopify le générera)
+            key = payload.get("product", {}).get("handle") or f"#{position}"
+            print(f"[{shop.name}] Création du produit Shopify : {label}")
+            with tracer.span("publish", shop=shop.name, product=label):
+                response = await create_shopify_product(session, payload, token_index=token_index, shop=shop, job=job)
             if response:
                 product_info = response.get("product", {})
-                print(f"→ Produit créé : {product_info.get('id')} - {product_info.get('title')}")
+                results[key] = product_info.get("id")
+                print(f"[{shop.name}] → Produit créé : {product_info.get('id')} - {product_info.get('title')}")
             else:
-                print(f"→ Échec de la création pour : {label}")
+                results[key] = None
+                print(f"[{shop.name}] → Échec de la création pour : {label}")
+    return results
 
 
 def main() -> None:
@@ -230,9 +327,66 @@ def main() -> None:
     )
     parser.add_argument("--token-index", type=int, default=0, help="Index du token Shopify à utiliser")
     parser.add_argument("--limit", type=int, default=None, help="Nombre maximum de produits à importer")
+    parser.add_argument(
+        "--store",
+        type=Path,
+        default=None,
+        help="Catalogue local tenu par API/webhooks.py : les produits déjà présents (SKU ou handle) sont ignorés",
+    )
+    parser.add_argument(
+        "--rejects",
+        type=Path,
+        default=Path(__file__).parent / "files" / "rejets.csv",
+        help="Fichier CSV recevant les produits refusés par la validation locale",
+    )
+    parser.add_argument(
+        "--vectorized",
+        action="store_true",
+        help="Nettoie les colonnes numériques par blocs avec pandas (gros fichiers)",
+    )
+    parser.add_argument(
+        "--shops",
+        default=None,
+        help="Boutiques cibles séparées par des virgules (définies dans shops.json), publiées en parallèle",
+    )
+    parser.add_argument(
+        "--profile",
+        nargs="?",
+        const="import_profile",
+        default=None,
+        metavar="PREFIXE",
+        help="Enregistre PREFIXE.prof (cProfile) et PREFIXE.trace.json (Chrome trace-event) pour l'import",
+    )
 
     args = parser.parse_args()
-    asyncio.run(import_products(args.csv_path, token_index=args.token_index, limit=args.limit))
+    if args.vectorized and not columnar_cleaning.is_available():
+        parser.error("--vectorized nécessite pandas (pip install pandas)")
+    store = ProductStore(str(args.store)).load() if args.store else None
+    run = import_products(
+        args.csv_path,
+        token_index=args.token_index,
+        limit=args.limit,
+        store=store,
+        rejects_path=args.rejects,
+        vectorized=args.vectorized,
+        shops=args.shops.split(",") if args.shops else None,
+    )
+    if not args.profile:
+        asyncio.run(run)
+        return
+
+    profiler = cProfile.Profile()
+    tracer.enable()
+    profiler.enable()
+    try:
+        asyncio.run(run)
+    finally:
+        profiler.disable()
+        tracer.disable()
+        profiler.dump_stats(f"{args.profile}.prof")
+        tracer.write(f"{args.profile}.trace.json")
+        pstats.Stats(profiler).sort_stats("cumulative").print_stats(15)
+        print(f"Profil écrit dans {args.profile}.prof et {args.profile}.trace.json (chrome://tracing ou Perfetto)")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,167 @@
+import argparse
+import asyncio
+import csv
+import re
+from pathlib import Path
+from typing import Dict, List
+
+from API.products import delete_shopify_products, get_all_products
+
+
+_HANDLE_SUFFIX = re.compile(r"^(.*)-\d+$")
+
+
+def _product_id_tags(product: Dict) -> List[str]:
+    tags = product.get("tags") or ""
+    if isinstance(tags, str):
+        tags = tags.split(",")
+    return [tag.strip() for tag in tags if tag.strip().startswith("product_id:")]
+
+
+def _normalize_title(title: str) -> str:
+    return re.sub(r"\s+", " ", title or "").strip().lower()
+
+
+def _duplicate_keys(product: Dict, handles: set) -> List[str]:
+    keys = []
+    for variant in product.get("variants", []):
+        sku = (variant.get("sku") or "").strip()
+        if sku:
+            keys.append(f"sku:{sku}")
+    handle = product.get("handle") or ""
+    if handle:
+        # Shopify suffixe "-1", "-2"… quand le handle existe déjà. Les nombres sont aussi
+        # courants dans les vrais handles (toile-aida-14) : le handle sans suffixe n'est
+        # une clé de doublon qu'accompagné du même titre normalisé
+        match = _HANDLE_SUFFIX.match(handle)
+        if match and match.group(1) in handles:
+            handle = match.group(1)
+        keys.append(f"handle:{handle}|{_normalize_title(product.get('title'))}")
+    keys.extend(f"tag:{tag}" for tag in _product_id_tags(product))
+    return keys
+
+
+def find_duplicate_groups(products: List[Dict]) -> List[Dict]:
+    """
+    Regroupe les produits partageant un SKU, un handle ou un tag product_id
+    (union-find : deux produits liés par des clés différentes finissent dans le même groupe).
+    Dans chaque groupe, le produit le plus ancien est conservé.
+    """
+    handles = {product.get("handle") for product in products if product.get("handle")}
+    parent = list(range(len(products)))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    first_by_key: Dict[str, int] = {}
+    keys_by_index: Dict[int, List[str]] = {}
+    for idx, product in enumerate(products):
+        keys = _duplicate_keys(product, handles)
+        keys_by_index[idx] = keys
+        for key in keys:
+            if key in first_by_key:
+                parent[find(idx)] = find(first_by_key[key])
+            else:
+                first_by_key[key] = idx
+
+    members: Dict[int, List[int]] = {}
+    for idx in range(len(products)):
+        members.setdefault(find(idx), []).append(idx)
+
+    groups = []
+    for indexes in members.values():
+        if len(indexes) < 2:
+            continue
+        ordered = sorted(indexes, key=lambda i: (products[i].get("created_at") or "", products[i]["id"]))
+        key_counts: Dict[str, int] = {}
+        for i in ordered:
+            for key in set(keys_by_index[i]):
+                key_counts[key] = key_counts.get(key, 0) + 1
+        groups.append({
+            "keep": products[ordered[0]],
+            "duplicates": [products[i] for i in ordered[1:]],
+            "keys": sorted(key for key, count in key_counts.items() if count > 1),
+        })
+    return groups
+
+
+_REPORT_COLUMNS = ["ID conservé", "Titre conservé", "ID doublon", "Titre doublon", "Créé le", "Clés communes", "Supprimé"]
+
+
+def _write_report(groups: List[Dict], report_path: Path) -> None:
+    with report_path.open("w", encoding="utf-8", newline="") as handle:
+        writer = csv.writer(handle, delimiter=";")
+        writer.writerow(_REPORT_COLUMNS)
+        for group in groups:
+            keep = group["keep"]
+            for duplicate in group["duplicates"]:
+                writer.writerow([
+                    keep["id"],
+                    keep.get("title", ""),
+                    duplicate["id"],
+                    duplicate.get("title", ""),
+                    duplicate.get("created_at", ""),
+                    ", ".join(group["keys"]),
+                    "",
+                ])
+
+
+async def purge_duplicates(report_path: Path, token_index: int = 0) -> None:
+    """Simulation : détecte les doublons et écrit le rapport, sans rien supprimer."""
+    products = await get_all_products(token_index=token_index)
+    print(f"{len(products)} produits récupérés")
+    groups = find_duplicate_groups(products)
+    duplicate_count = sum(len(group["duplicates"]) for group in groups)
+    print(f"{len(groups)} groupes de doublons, {duplicate_count} produits à supprimer")
+    _write_report(groups, report_path)
+    print(f"Rapport écrit dans {report_path} ; après relecture, relancer avec --apply {report_path}")
+
+
+async def apply_report(report_path: Path) -> None:
+    """Supprime exactement les IDs de la colonne « ID doublon » du rapport relu, puis le complète."""
+    with report_path.open("r", encoding="utf-8", newline="") as handle:
+        rows = list(csv.DictReader(handle, delimiter=";"))
+    duplicate_ids = [int(row["ID doublon"]) for row in rows if row.get("ID doublon")]
+    print(f"{len(duplicate_ids)} produits à supprimer d'après {report_path}")
+
+    results = await delete_shopify_products(duplicate_ids)
+    for row in rows:
+        if row.get("ID doublon"):
+            row["Supprimé"] = "oui" if results.get(int(row["ID doublon"])) else "échec"
+    with report_path.open("w", encoding="utf-8", newline="") as handle:
+        writer = csv.DictWriter(handle, fieldnames=_REPORT_COLUMNS, delimiter=";")
+        writer.writeheader()
+        writer.writerows(rows)
+    failures = sum(1 for ok in results.values() if not ok)
+    print(f"{len(results) - failures} produits supprimés, {failures} échecs, rapport mis à jour : {report_path}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Détecte et supprime les produits Shopify en double (SKU, handle, tag product_id).")
+    parser.add_argument(
+        "--report",
+        type=Path,
+        default=Path(__file__).parent / "files" / "doublons.csv",
+        help="Chemin du rapport CSV des doublons (simulation)",
+    )
+    parser.add_argument(
+        "--apply",
+        type=Path,
+        default=None,
+        metavar="RAPPORT",
+        help="Supprime les doublons listés dans ce rapport relu (aucune nouvelle détection)",
+    )
+    parser.add_argument("--token-index", type=int, default=0, help="Index du token Shopify utilisé pour la lecture du catalogue")
+
+    args = parser.parse_args()
+    if args.apply:
+        asyncio.run(apply_report(args.apply))
+    else:
+        asyncio.run(purge_duplicates(args.report, token_index=args.token_index))
+
+
+if __name__ == "__main__":
+    main()
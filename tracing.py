@@ -0,0 +1,95 @@
+import asyncio
+import contextlib
+import json
+import os
+import threading
+import time
+from typing import Dict, List
+
+
+class _Span:
+    __slots__ = ("tracer", "name", "category", "args", "start")
+
+    def __init__(self, tracer: "Tracer", name: str, category: str, args: Dict):
+        self.tracer = tracer
+        self.name = name
+        self.category = category
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter()
+        if exc_type is not None:
+            self.args["error"] = exc_type.__name__
+        self.tracer.record(self.name, self.category, self.start, end, self.args)
+        return False
+
+
+class Tracer:
+    """
+    Enregistre des spans (durées nommées) au format Chrome trace-event, lisible
+    dans chrome://tracing ou Perfetto. Chaque tâche asyncio a sa propre ligne.
+    Désactivé par défaut : span() renvoie alors un contexte vide quasi gratuit.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.events: List[Dict] = []
+        self._origin = time.perf_counter()
+        self._lanes: Dict[object, int] = {}
+        self._lock = threading.Lock()
+
+    def enable(self) -> None:
+        self.events = []
+        self._lanes = {}
+        self._origin = time.perf_counter()
+        self.enabled = True
+
+    def disable(self) -> None:
+        self.enabled = False
+
+    def span(self, name: str, category: str = "import", **args):
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name, category, args)
+
+    def _lane(self) -> int:
+        try:
+            owner = asyncio.current_task()
+        except RuntimeError:
+            owner = None
+        if owner is None:
+            owner = threading.get_ident()
+        if owner not in self._lanes:
+            self._lanes[owner] = len(self._lanes) + 1
+            name = owner.get_name() if isinstance(owner, asyncio.Task) else f"thread-{owner}"
+            self.events.append({
+                "name": "thread_name", "ph": "M", "pid": os.getpid(),
+                "tid": self._lanes[owner], "args": {"name": name},
+            })
+        return self._lanes[owner]
+
+    def record(self, name: str, category: str, start: float, end: float, args: Dict) -> None:
+        with self._lock:
+            self.events.append({
+                "name": name,
+                "cat": category,
+                "ph": "X",
+                "ts": (start - self._origin) * 1e6,
+                "dur": (end - start) * 1e6,
+                "pid": os.getpid(),
+                "tid": self._lane(),
+                "args": args,
+            })
+
+    def write(self, path) -> None:
+        with open(path, "w", encoding="utf-8") as handle:
+            json.dump({"traceEvents": self.events, "displayTimeUnit": "ms"}, handle)
+
+
+_NULL_SPAN = contextlib.nullcontext()
+
+tracer = Tracer()
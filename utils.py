@@ -5,12 +5,28 @@ import time
 import asyncio
 import aiohttp
 import sys
+from collections import deque
+
+from tracing import tracer
 
 
 
 
 _tokens = None
 _rate_limiters = {}
+_cost_budgets = {}
+_shops = None
+
+# Classes de priorité des requêtes (plus petit = plus urgent)
+PRIORITY_INVENTORY = 0
+PRIORITY_PRICE = 1
+PRIORITY_CREATE = 2
+PRIORITY_BACKFILL = 3
+
+# Boutique par défaut, utilisant les tokens de tokens.json
+DEFAULT_SHOP_NAME = "default"
+DEFAULT_SHOPIFY_DOMAIN = "broderiedumonde.com"
+DEFAULT_API_VERSION = "2025-01"
 
 
 class RateLimiter:
@@ -27,22 +43,195 @@ class RateLimiter:
             self.calls = [t for t in self.calls if now - t < self.period]
             if len(self.calls) >= self.max_calls:
                 sleep_time = self.period - (now - self.calls[0])
-                await asyncio.sleep(sleep_time)
+                with tracer.span("limiter_wait", "rate_limit"):
+                    await asyncio.sleep(sleep_time)
                 now = time.monotonic()
                 self.calls = [t for t in self.calls if now - t < self.period]
             self.calls.append(now)
 
 
+class RequestScheduler:
+    """
+    File d'attente par priorité placée devant un RateLimiter : chaque créneau libéré
+    est attribué à la classe la plus urgente (stock > prix > création > backfill),
+    en alternant entre les jobs d'une même classe. Une classe délaissée gagne un
+    niveau de priorité par période `aging_period` sans être servie (anti-famine).
+    """
+
+    def __init__(self, limiter, aging_period=10.0):
+        self.limiter = limiter
+        self.aging_period = aging_period
+        self._queues = {}
+        self._job_order = {}
+        self._last_served = {}
+        self._dispatcher = None
+
+    async def acquire(self, priority=PRIORITY_CREATE, job="default"):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        jobs = self._queues.setdefault(priority, {})
+        if job not in jobs:
+            jobs[job] = deque()
+            self._job_order.setdefault(priority, deque()).append(job)
+        jobs[job].append((time.monotonic(), future))
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = loop.create_task(self._dispatch())
+        with tracer.span("queue_wait", "rate_limit", priority=priority, job=job):
+            await future
+
+    def _next_future(self):
+        now = time.monotonic()
+        selected = None
+        for priority, jobs in self._queues.items():
+            oldest = min(queue[0][0] for queue in jobs.values())
+            waiting_since = max(oldest, self._last_served.get(priority, oldest))
+            effective = priority - (now - waiting_since) / self.aging_period
+            if selected is None or (effective, priority) < selected:
+                selected = (effective, priority)
+        priority = selected[1]
+
+        jobs = self._queues[priority]
+        order = self._job_order[priority]
+        job = order[0]
+        order.rotate(-1)
+        _, future = jobs[job].popleft()
+        if not jobs[job]:
+            del jobs[job]
+            order.remove(job)
+        if not jobs:
+            del self._queues[priority]
+            del self._job_order[priority]
+        self._last_served[priority] = now
+        return future
+
+    async def _dispatch(self):
+        while self._queues:
+            future = self._next_future()
+            if future.done():
+                # Appelant annulé pendant l'attente
+                continue
+            await self.limiter.acquire()
+            if not future.done():
+                future.set_result(None)
+
+
+class QueryCostBudget:
+    """
+    Seau de points de coût GraphQL (leaky bucket Shopify), recalé sur le
+    throttleStatus renvoyé dans extensions.cost de chaque réponse.
+    """
+
+    def __init__(self, maximum=1000.0, restore_rate=50.0):
+        self.maximum = maximum
+        self.restore_rate = restore_rate
+        self.available = maximum
+        self.updated_at = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.available = min(self.maximum, self.available + (now - self.updated_at) * self.restore_rate)
+        self.updated_at = now
+
+    async def acquire(self, cost):
+        async with self.lock:
+            self._refill()
+            cost = min(cost, self.maximum)
+            if self.available < cost:
+                await asyncio.sleep((cost - self.available) / self.restore_rate)
+                self._refill()
+            self.available -= cost
+
+    def update(self, throttle_status):
+        if not throttle_status:
+            return
+        self.maximum = float(throttle_status.get("maximumAvailable", self.maximum))
+        self.restore_rate = float(throttle_status.get("restoreRate", self.restore_rate))
+        self.available = float(throttle_status.get("currentlyAvailable", self.available))
+        self.updated_at = time.monotonic()
+
+class ShopConfig:
+    """
+    Configuration d'une boutique : domaine, version d'API et tokens, avec un
+    rate limiter et un budget GraphQL propres à chaque token de la boutique.
+    """
+
+    def __init__(self, name, domain, api_version, tokens, rate_limiters=None, cost_budgets=None):
+        self.name = name
+        self.domain = domain
+        self.api_version = api_version
+        self.tokens = tokens
+        self.rate_limiters = rate_limiters if rate_limiters is not None else {}
+        self.cost_budgets = cost_budgets if cost_budgets is not None else {}
+        for key in self.tokens.keys():
+            self.rate_limiters.setdefault(key, RequestScheduler(RateLimiter(max_calls=2, period=1.0)))
+            self.cost_budgets.setdefault(key, QueryCostBudget())
+
+    def get_access_token(self, token_index=0):
+        token_keys = list(self.tokens.keys())
+        selected_key = token_keys[token_index % len(token_keys)]
+        return self.tokens[selected_key], selected_key
+
+    def url(self, path):
+        return f"https://{self.domain}/admin/api/{self.api_version}/{path}"
+
+
+def _base_dir():
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+
+def load_shops():
+    """
+    Charge les boutiques de shops.json (à côté de tokens.json), au format
+    {"nom": {"domain": ..., "api_version": ..., "tokens": {"clé": "token"}}}.
+    La boutique "default" reprend toujours tokens.json et partage ses rate limiters.
+    """
+    global _shops
+    if _tokens is None:
+        load_tokens()
+    _shops = {
+        DEFAULT_SHOP_NAME: ShopConfig(
+            DEFAULT_SHOP_NAME,
+            DEFAULT_SHOPIFY_DOMAIN,
+            DEFAULT_API_VERSION,
+            _tokens,
+            rate_limiters=_rate_limiters,
+            cost_budgets=_cost_budgets,
+        )
+    }
+    shops_file = os.path.join(_base_dir(), 'shops.json')
+    if os.path.exists(shops_file):
+        with open(shops_file, 'r', encoding='utf-8') as f:
+            for name, conf in json.load(f).items():
+                _shops[name] = ShopConfig(
+                    name,
+                    conf["domain"],
+                    conf.get("api_version", DEFAULT_API_VERSION),
+                    conf["tokens"],
+                )
+    return _shops
+
+
+def get_shop(name=None):
+    if _shops is None:
+        load_shops()
+    name = name or DEFAULT_SHOP_NAME
+    if name not in _shops:
+        raise KeyError(f"Boutique inconnue : {name} (disponibles : {', '.join(_shops)})")
+    return _shops[name]
+
 
 def load_tokens():
     global _tokens, _rate_limiters
-    base_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+    base_dir = _base_dir()
     tokens_file = os.path.join(base_dir, 'tokens.json')
     with open(tokens_file, 'r', encoding='utf-8') as f:
         _tokens = json.load(f)
-    # Créer un rate limiter pour chaque token
+    # Créer un rate limiter (derrière l'ordonnanceur de priorités) pour chaque token,
+    # en conservant ceux existants pour que tous les modules partagent le même budget
     for key in _tokens.keys():
-        _rate_limiters[key] = RateLimiter(max_calls=2, period=1.0)
+        _rate_limiters.setdefault(key, RequestScheduler(RateLimiter(max_calls=2, period=1.0)))
+        _cost_budgets.setdefault(key, QueryCostBudget())
 
 
 
@@ -54,3 +243,9 @@ def get_access_token(token_index=0):
     selected_key = token_keys[token_index % len(token_keys)]
     return _tokens[selected_key], selected_key
 
+
+def get_token_count():
+    global _tokens
+    if _tokens is None:
+        load_tokens()
+    return len(_tokens)